@@ -1,16 +1,35 @@
 from __future__ import annotations
+import sqlite3
+
 from flask import Flask
 from flask_cors import CORS
 
-from config import create_dirs_if_needed
+from config import DB_PATH, create_dirs_if_needed
 from routes import api
 
+def _enable_wal() -> None:
+    """Put garmin.db in WAL mode with relaxed fsync (persists in the file).
+
+    WAL lets the read-only API connections proceed while garmindb writes,
+    instead of contending on a rollback journal.
+    """
+    if not DB_PATH.exists():
+        return
+    con = sqlite3.connect(DB_PATH)
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.commit()
+    finally:
+        con.close()
+
 def create_app() -> Flask:
     app = Flask(__name__)
     CORS(app)
 
     # make sure base dirs/config exist (no-ops if already present)
     create_dirs_if_needed()
+    _enable_wal()
 
     # register API blueprint
     app.register_blueprint(api)
@@ -2,12 +2,13 @@
 Paths, default config, and a couple tiny helpers.
 """
 from __future__ import annotations
-import json
 import os
 import sys
 from pathlib import Path
 from typing import Any, Dict, List
 
+import orjson
+
 APP_ROOT = Path(__file__).resolve().parent
 UPDATE_LOG = APP_ROOT / "update.log"
 
@@ -47,14 +48,31 @@ DEFAULT_CFG: Dict[str, Any] = {
 CLI = str(Path(sys.executable).parent / "garmindb_cli.py")
 
 
+# Once the tree/config are known to exist, skip the stat calls on every
+# /api/ensure-folders hit. /api/erase resets these via invalidate_tree_cache.
+_TREE_READY = False
+_CFG_READY = False
+
+
+def invalidate_tree_cache() -> None:
+    """Forget cached tree/config state (call after erasing the data tree)."""
+    global _TREE_READY, _CFG_READY
+    _TREE_READY = False
+    _CFG_READY = False
+
+
 def ensure_healthdata_tree() -> list[str]:
     """Create expected ~/HealthData tree; return created path strings."""
+    global _TREE_READY
+    if _TREE_READY:
+        return []
     created: list[str] = []
     DATA_ROOT.mkdir(parents=True, exist_ok=True)
     for p in REQUIRED_PATHS:
         if not p.exists():
             p.mkdir(parents=True, exist_ok=True)
             created.append(str(p))
+    _TREE_READY = True
     return created
 
 
@@ -64,13 +82,13 @@ def read_cfg() -> Dict[str, Any]:
     if not CFG_PATH.exists():
         write_cfg(DEFAULT_CFG.copy())
         return DEFAULT_CFG.copy()
-    return json.loads(CFG_PATH.read_text(encoding="utf-8"))
+    return orjson.loads(CFG_PATH.read_bytes())
 
 
 def write_cfg(cfg: Dict[str, Any]) -> None:
     """Write config and try to chmod 0600."""
     CFG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CFG_PATH.write_text(json.dumps(cfg, indent=4), encoding="utf-8")
+    CFG_PATH.write_bytes(orjson.dumps(cfg, option=orjson.OPT_INDENT_2))
     try:
         os.chmod(CFG_PATH, 0o600)
     except Exception:
@@ -79,6 +97,9 @@ def write_cfg(cfg: Dict[str, Any]) -> None:
 
 def create_dirs_if_needed() -> None:
     """Idempotent: make tree + config if missing."""
+    global _CFG_READY
     ensure_healthdata_tree()
-    if not CFG_PATH.exists():
-        write_cfg(DEFAULT_CFG.copy())
+    if not _CFG_READY:
+        if not CFG_PATH.exists():
+            write_cfg(DEFAULT_CFG.copy())
+        _CFG_READY = True
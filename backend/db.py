@@ -3,168 +3,200 @@ SQLite connection helpers and data fetchers.
 """
 from __future__ import annotations
 import sqlite3
-from contextlib import contextmanager
+import threading
+from functools import lru_cache
 from typing import Any, Dict, List
 
-import pandas as pd
-
 from config import DB_PATH
 
-@contextmanager
-def connect():
-    con = sqlite3.connect(DB_PATH)
-    try:
-        yield con
-    finally:
+_pool = threading.local()
+
+# Process-wide generation counter: reset_connections bumps it, and every
+# thread reopens its connection on the next _get_con once its own generation
+# falls behind. Closing only the calling thread's handle would leave the
+# other worker threads reading the old inode after the DB file is replaced.
+_gen = 0
+_gen_lock = threading.Lock()
+
+def _get_con() -> sqlite3.Connection:
+    """Thread-local read-only connection, opened once per thread and reused.
+
+    SQLite's page cache is per-connection and discarded on close, so the old
+    connect-per-request pattern paid the open/close cost plus a cold cache on
+    every fetch. The PRAGMAs give each reader a 64 MiB page cache, mmap'd
+    reads and in-memory temp storage. Connections deliberately stay open
+    until reset_connections starts a new generation.
+    """
+    con = getattr(_pool, "con", None)
+    if con is None or _pool.gen != _gen:
+        if con is not None:
+            con.close()
+        con = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        con.executescript(
+            "PRAGMA query_only=1;"
+            "PRAGMA mmap_size=268435456;"
+            "PRAGMA cache_size=-65536;"
+            "PRAGMA temp_store=MEMORY;"
+        )
+        _pool.con = con
+        _pool.gen = _gen
+    return con
+
+def reset_connections() -> None:
+    """Invalidate all cached connections and schema state (after the DB file
+    is erased or garmindb rewrites it)."""
+    global _gen
+    with _gen_lock:
+        _gen += 1
+    con = getattr(_pool, "con", None)
+    if con is not None:
         con.close()
-
-def table_exists(con: sqlite3.Connection, name: str) -> bool:
+        _pool.con = None
+    table_exists.cache_clear()
+    get_columns.cache_clear()
+    _queries.cache_clear()
+
+@lru_cache(maxsize=64)
+def table_exists(name: str) -> bool:
+    # Schema doesn't change between requests, so probe once and cache.
     q = "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?"
-    return pd.read_sql(q, con, params=(name,)).shape[0] > 0
+    return _get_con().execute(q, (name,)).fetchone() is not None
 
-def get_columns(con: sqlite3.Connection, table: str) -> List[str]:
+@lru_cache(maxsize=64)
+def get_columns(table: str) -> List[str]:
     try:
-        return pd.read_sql(f"PRAGMA table_info({table});", con)["name"].tolist()
+        return [r[1] for r in _get_con().execute(f"PRAGMA table_info({table})").fetchall()]
     except Exception:
         return []
 
-def _to_seconds(series: pd.Series) -> pd.Series:
-    num = pd.to_numeric(series, errors="coerce")
-    if num.notna().any():
-        return num.astype(float)
-    return pd.to_timedelta(series, errors="coerce").dt.total_seconds()
-
-# ------------------------ fetchers ------------------------
-
-def fetch_daily_summary() -> List[Dict[str, Any]]:
-    with connect() as con:
-        has_sleep = table_exists(con, "sleep_summary")
-        has_sleep_seconds = "sleep_seconds" in get_columns(con, "sleep_summary") if has_sleep else False
-
-        if has_sleep and has_sleep_seconds:
-            q = """
-            SELECT ds.day AS date, ds.steps AS steps, ds.rhr AS restingHeartRate, ss.sleep_seconds AS sleepSeconds
-            FROM daily_summary ds LEFT JOIN sleep_summary ss ON ss.day = ds.day
-            ORDER BY ds.day DESC
-            """
-        else:
-            q = """
-            SELECT day AS date, steps AS steps, rhr AS restingHeartRate, NULL AS sleepSeconds
-            FROM daily_summary
-            ORDER BY day DESC
-            """
-        return pd.read_sql(q, con).to_dict(orient="records")
-
-def fetch_sleep() -> List[Dict[str, Any]]:
-    with connect() as con:
-        if not table_exists(con, "sleep"):
-            raise RuntimeError("No 'sleep' table found.")
-        q = """
-        SELECT day, total_sleep, deep_sleep, light_sleep, rem_sleep, awake,
-               avg_spo2, avg_rr, avg_stress, score, qualifier
-        FROM sleep ORDER BY day DESC
+def _secs_sql(col: str) -> str:
+    """SQL expression turning an HH:MM:SS time column into integer seconds (NULL-safe)."""
+    return f"CAST(strftime('%s', {col}) AS INTEGER) - CAST(strftime('%s', '00:00:00') AS INTEGER)"
+
+def _query_payload(con: sqlite3.Connection, q: str) -> Dict[str, Any]:
+    """Build the JSON-Tables envelope straight off a raw cursor.
+
+    sqlite3 rows are already row-major, so this is one comprehension that
+    applies the None -> 0 policy on the way through -- no DataFrame
+    round-trip for plain SELECTs.
+    """
+    cur = con.execute(q)
+    return {
+        "__dict_type": "table",
+        "cols": [d[0] for d in cur.description],
+        "row_data": [[0 if v is None else v for v in r] for r in cur.fetchall()],
+    }
+
+@lru_cache(maxsize=1)
+def _queries() -> Dict[str, Dict[str, str]]:
+    """SELECT statements specialized per endpoint for the observed schema.
+
+    The table/column probes run once per schema generation; /api/update and
+    /api/erase invalidate via reset_connections. Each statement is built
+    independently: a missing table or column lands in "errors" under that
+    endpoint's key and disables only that endpoint.
+    """
+    sql: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    has_ds = table_exists("daily_summary")
+    cols = set(get_columns("daily_summary")) if has_ds else set()
+    ds_err = None if has_ds else "daily_summary table not found"
+
+    if ds_err:
+        errors["daily_summary"] = ds_err
+    elif table_exists("sleep_summary") and "sleep_seconds" in get_columns("sleep_summary"):
+        sql["daily_summary"] = """
+        SELECT ds.day AS date, ds.steps AS steps, ds.rhr AS restingHeartRate, ss.sleep_seconds AS sleepSeconds
+        FROM daily_summary ds LEFT JOIN sleep_summary ss ON ss.day = ds.day
+        ORDER BY ds.day DESC
         """
-        df = pd.read_sql(q, con)
-
-    stage_cols = ["total_sleep", "deep_sleep", "light_sleep", "rem_sleep", "awake"]
-    for col in stage_cols:
-        sec_col = f"{col}_seconds"
-        hr_col = f"{col}_hours"
-        if col in df.columns:
-            secs = _to_seconds(df[col])
-            df[sec_col] = secs.astype("Int64")
-            df[hr_col] = (secs / 3600.0).round(2)
-        else:
-            df[sec_col] = pd.Series([pd.NA] * len(df), dtype="Int64")
-            df[hr_col] = pd.Series([float('nan')] * len(df), dtype="float")
-
-    df = df.rename(columns={"day": "date"})
-    preferred = [
-        "date",
-        "total_sleep", "total_sleep_seconds", "total_sleep_hours",
-        "deep_sleep", "deep_sleep_seconds", "deep_sleep_hours",
-        "light_sleep", "light_sleep_seconds", "light_sleep_hours",
-        "rem_sleep", "rem_sleep_seconds", "rem_sleep_hours",
-        "awake", "awake_seconds", "awake_hours",
-        "avg_spo2", "avg_rr", "avg_stress", "score", "qualifier",
-    ]
-    out = [c for c in preferred if c in df.columns]
-    df = df.replace({pd.NA: None, float("nan"): None})
-    return df[out].to_dict(orient="records")
-
-def fetch_steps() -> List[Dict[str, Any]]:
-    with connect() as con:
-        if not table_exists(con, "daily_summary"):
-            raise RuntimeError("daily_summary table not found")
-        cols = set(get_columns(con, "daily_summary"))
-        if not {"day", "steps"}.issubset(cols):
-            raise RuntimeError(f"Missing columns in daily_summary: need {{'day','steps'}}, have {cols}")
+    else:
+        sql["daily_summary"] = """
+        SELECT day AS date, steps AS steps, rhr AS restingHeartRate, NULL AS sleepSeconds
+        FROM daily_summary
+        ORDER BY day DESC
+        """
+
+    if ds_err:
+        errors["steps"] = ds_err
+    elif not {"day", "steps"}.issubset(cols):
+        errors["steps"] = f"Missing columns in daily_summary: need {{'day','steps'}}, have {cols}"
+    else:
         extra = ", step_goal" if "step_goal" in cols else ", NULL AS step_goal"
-        q = f"SELECT day AS date, steps{extra} FROM daily_summary ORDER BY day DESC"
-        df = pd.read_sql(q, con)
-
-    # Replace NaN/NA with None for JSON compatibility
-    df = df.replace({pd.NA: None, float("nan"): None})
-    return df.to_dict(orient="records")
-
-def fetch_stress() -> List[Dict[str, Any]]:
-    with connect() as con:
-        if not table_exists(con, "daily_summary"):
-            raise RuntimeError("daily_summary table not found")
-        cols = set(get_columns(con, "daily_summary"))
-        if not {"day", "stress_avg"}.issubset(cols):
-            raise RuntimeError(f"daily_summary missing 'stress_avg' or 'day'. Columns: {cols}")
-        q = """
+        sql["steps"] = f"SELECT day AS date, steps{extra} FROM daily_summary ORDER BY day DESC"
+
+    if ds_err:
+        errors["stress"] = ds_err
+    elif not {"day", "stress_avg"}.issubset(cols):
+        errors["stress"] = f"daily_summary missing 'stress_avg' or 'day'. Columns: {cols}"
+    else:
+        sql["stress"] = """
         SELECT day AS date, stress_avg
         FROM daily_summary
         ORDER BY day DESC
         """
-        df = pd.read_sql(q, con)
-
-    df = df.replace({pd.NA: None, float("nan"): None})
-    return df.to_dict(orient="records")
-
-
-def fetch_exercise() -> List[Dict[str, Any]]:
-    with connect() as con:
-        if not table_exists(con, "daily_summary"):
-            raise RuntimeError("daily_summary table not found")
-        cols = set(get_columns(con, "daily_summary"))
-        needed = {"day", "moderate_activity_time", "vigorous_activity_time", "intensity_time_goal"}
-        if not needed.issubset(cols):
-            raise RuntimeError(f"daily_summary missing time columns: need {needed}, have {cols}")
 
+    needed = {"day", "moderate_activity_time", "vigorous_activity_time", "intensity_time_goal"}
+    if ds_err:
+        errors["exercise"] = ds_err
+    elif not needed.issubset(cols):
+        errors["exercise"] = f"daily_summary missing time columns: need {needed}, have {cols}"
+    else:
         select_bits = [
             "day AS date",
             "moderate_activity_time",
             "vigorous_activity_time",
             "intensity_time_goal",
+            f"{_secs_sql('moderate_activity_time')} AS moderate_activity_seconds",
+            f"{_secs_sql('vigorous_activity_time')} AS vigorous_activity_seconds",
+            f"{_secs_sql('intensity_time_goal')} AS intensity_time_goal_seconds",
+            f"COALESCE({_secs_sql('moderate_activity_time')}, 0)"
+            f" + COALESCE({_secs_sql('vigorous_activity_time')}, 0) AS total_activity_seconds",
             "distance" if "distance" in cols else "NULL AS distance",
             "calories_active" if "calories_active" in cols else "NULL AS calories_active",
             "calories_total" if "calories_total" in cols else "NULL AS calories_total",
         ]
-        q = f"SELECT {', '.join(select_bits)} FROM daily_summary ORDER BY day DESC"
-        df = pd.read_sql(q, con)
-
-    # Convert HH:MM:SS to seconds
-    to_sec = lambda s: pd.to_timedelta(s, errors="coerce").dt.total_seconds()
-    df["moderate_activity_seconds"]   = to_sec(df["moderate_activity_time"])
-    df["vigorous_activity_seconds"]   = to_sec(df["vigorous_activity_time"])
-    df["intensity_time_goal_seconds"] = to_sec(df["intensity_time_goal"])
-    df["total_activity_seconds"] = (
-        df["moderate_activity_seconds"].fillna(0) +
-        df["vigorous_activity_seconds"].fillna(0)
-    ).astype("Int64")
-
-    # Replace NaN/NA with None
-    df = df.replace({pd.NA: None, float("nan"): None})
-
-    cols_out = [
-        "date",
-        "moderate_activity_time", "vigorous_activity_time", "intensity_time_goal",
-        "moderate_activity_seconds", "vigorous_activity_seconds", "intensity_time_goal_seconds",
-        "total_activity_seconds",
-        "distance", "calories_active", "calories_total",
-    ]
-    return df[cols_out].to_dict(orient="records")
+        sql["exercise"] = f"SELECT {', '.join(select_bits)} FROM daily_summary ORDER BY day DESC"
+
+    if not table_exists("sleep"):
+        errors["sleep"] = "No 'sleep' table found."
+    else:
+        # Stage columns may be stored numeric (already seconds) or as HH:MM:SS.
+        def stage(col: str) -> List[str]:
+            sec = (f"CASE WHEN typeof({col}) IN ('integer', 'real') THEN {col}"
+                   f" ELSE strftime('%s', {col}) - strftime('%s', '00:00:00') END")
+            return [col,
+                    f"CAST({sec} AS INTEGER) AS {col}_seconds",
+                    f"ROUND({sec} / 3600.0, 2) AS {col}_hours"]
+
+        sleep_bits = ["day AS date"]
+        for c in ("total_sleep", "deep_sleep", "light_sleep", "rem_sleep", "awake"):
+            sleep_bits += stage(c)
+        sleep_bits += ["avg_spo2", "avg_rr", "avg_stress", "score", "qualifier"]
+        sql["sleep"] = f"SELECT {', '.join(sleep_bits)} FROM sleep ORDER BY day DESC"
+
+    return {"sql": sql, "errors": errors}
+
+def _endpoint_query(name: str) -> str:
+    built = _queries()
+    if name in built["errors"]:
+        raise RuntimeError(built["errors"][name])
+    return built["sql"][name]
+
+# ------------------------ fetchers ------------------------
+
+def fetch_daily_summary() -> Dict[str, Any]:
+    return _query_payload(_get_con(), _endpoint_query("daily_summary"))
+
+def fetch_sleep() -> Dict[str, Any]:
+    return _query_payload(_get_con(), _endpoint_query("sleep"))
+
+def fetch_steps() -> Dict[str, Any]:
+    return _query_payload(_get_con(), _endpoint_query("steps"))
+
+def fetch_stress() -> Dict[str, Any]:
+    return _query_payload(_get_con(), _endpoint_query("stress"))
+
 
+def fetch_exercise() -> Dict[str, Any]:
+    return _query_payload(_get_con(), _endpoint_query("exercise"))
@@ -2,68 +2,110 @@
 All HTTP routes (Blueprint).
 """
 from __future__ import annotations
+import itertools
 import os
 import shutil
 import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 import shlex
-from flask import Blueprint, jsonify, request, current_app
-import math
+import orjson
+from flask import Blueprint, request, current_app
 
 from config import (
     UPDATE_LOG, DATA_ROOT, DB_PATH, CFG_PATH, CLI,
-    read_cfg, write_cfg, ensure_healthdata_tree, DEFAULT_CFG,
+    read_cfg, write_cfg, ensure_healthdata_tree, invalidate_tree_cache, DEFAULT_CFG,
+)
+from db import (
+    fetch_daily_summary, fetch_sleep, fetch_steps, fetch_stress, fetch_exercise,
+    reset_connections,
 )
-from db import fetch_daily_summary, fetch_sleep, fetch_steps, fetch_stress, fetch_exercise
 
 api = Blueprint("api", __name__)
 
 # ---------- tiny helpers ----------
 
-def _clean_json(value):
-    """Recursively convert NaN/Inf/None -> 0 so graphs show 0 instead of missing."""
-    if isinstance(value, dict):
-        return {k: _clean_json(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [_clean_json(v) for v in value]
-    if isinstance(value, float):
-        return value if math.isfinite(value) else 0
-    if value is None:
-        return 0
-    return value
+def _json(obj, status: int = 200):
+    """jsonify replacement: orjson serializes in native code, ~10x faster on big lists."""
+    return current_app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+        status=status,
+        mimetype="application/json",
+    )
 
 def _json_error(msg: str, status: int = 500):
-    return jsonify({"error": msg}), status
+    return _json({"error": msg}, status)
+
+# TTL-cached stat: one syscall per second instead of one per data request.
+_DB_STAT_CACHE = {"t": 0.0, "exists": False}
 
 def _require_db_exists():
-    if not DB_PATH.exists():
+    now = time.monotonic()
+    if now - _DB_STAT_CACHE["t"] > 1.0:
+        _DB_STAT_CACHE.update(exists=DB_PATH.exists(), t=now)
+    if not _DB_STAT_CACHE["exists"]:
         return _json_error(f"Database not found at {DB_PATH}", 503)
     return None
 
-def _run_garmindb():
-    """Run garmindb CLI and capture logs."""
+# Serialized response bodies keyed on (path, DB mtime). garmin.db only changes
+# when /api/update runs, so repeat calls skip SQLite and orjson entirely.
+_RESP_CACHE: dict[tuple[str, int], bytes] = {}
+
+def _cached_fetch(fetcher):
+    try:
+        key = (request.path, DB_PATH.stat().st_mtime_ns)
+    except FileNotFoundError:
+        # DB vanished between the guard and here (e.g. mid-erase)
+        return _json_error(f"Database not found at {DB_PATH}", 503)
+    body = _RESP_CACHE.get(key)
+    if body is None:
+        body = orjson.dumps(fetcher(), option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        for k in [k for k in _RESP_CACHE if k[1] != key[1]]:  # drop the stale generation
+            del _RESP_CACHE[k]
+        _RESP_CACHE[key] = body
+    return current_app.response_class(body, mimetype="application/json")
+
+# Single worker: a garmindb run takes minutes and must not pile up concurrently.
+_UPDATE_POOL = ThreadPoolExecutor(max_workers=1)
+_JOBS: dict[int, Future] = {}
+_JOB_IDS = itertools.count(1)
+
+def _run_garmindb(mode: str = "latest"):
+    """Run the garmindb CLI and capture logs. Incremental unless mode == "full"."""
     env = {**os.environ, "HOME": str(DATA_ROOT.parent)}
-    cmd = [CLI, "-a", "-m", "-s", "--download", "--import", "--analyze", "-l"]
+    cmd = [CLI, "--all", "--download", "--import", "--analyze"]
+    if mode == "latest":
+        cmd.append("--latest")  # incremental update
 
     started = datetime.utcnow()
-    cp = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    # Redirect the CLI straight into the log file: the kernel does the copying
+    # and a multi-minute run no longer buffers megabytes of output in memory.
+    with UPDATE_LOG.open("ab") as f:
+        f.write(f"$ {' '.join(cmd)}\n".encode("utf-8"))
+        f.flush()
+        cp = subprocess.run(cmd, env=env, stdout=f, stderr=subprocess.STDOUT)
+        f.write(f"\nexit={cp.returncode}\n".encode("utf-8"))
     ended = datetime.utcnow()
 
-    with UPDATE_LOG.open("a", encoding="utf-8") as f:
-        f.write(f"\n$ {' '.join(cmd)}\n")
-        f.write(cp.stdout)
-        f.write(cp.stderr)
-        f.write(f"\nexit={cp.returncode}\n")
-
+    # DB contents (and possibly schema: new tables/columns) changed; drop the
+    # cached responses, connections, schema probes and prebuilt statements.
+    _RESP_CACHE.clear()
+    reset_connections()
+    try:
+        tail = UPDATE_LOG.read_text("utf-8", errors="replace").splitlines()[-50:]
+    except OSError:
+        tail = []
     return {
         "started_at": started.isoformat() + "Z",
         "ended_at": ended.isoformat() + "Z",
         "duration_seconds": (ended - started).total_seconds(),
+        "mode": mode,
+        "command": " ".join(shlex.quote(x) for x in cmd),
         "returncode": cp.returncode,
         "ok": (cp.returncode == 0),
         "log": str(UPDATE_LOG),
-        "stdout": cp.stdout,
-        "stderr": cp.stderr,
+        "logTail": "\n".join(tail),  # last 50 lines for quick debugging
     }
 
 # ---------- routes ----------
@@ -73,7 +115,7 @@ def get_config():
     cfg = read_cfg()
     if "credentials" in cfg and "password" in cfg["credentials"]:
         cfg["credentials"]["password"] = ""
-    return jsonify(cfg)
+    return _json(cfg)
 
 @api.post("/api/config")
 def update_config():
@@ -115,7 +157,7 @@ def update_config():
         cfg["garmin"]["domain"] = payload["garmin"]["domain"]
 
     write_cfg(cfg)
-    return jsonify({"ok": True})
+    return _json({"ok": True})
 
 @api.post("/api/ensure-folders")
 def ensure_folders():
@@ -125,7 +167,7 @@ def ensure_folders():
         if not CFG_PATH.exists():
             write_cfg(DEFAULT_CFG.copy())
             wrote_cfg = True
-        return jsonify({
+        return _json({
             "ok": True,
             "data_root": str(DATA_ROOT),
             "created_paths": created,
@@ -138,49 +180,34 @@ def ensure_folders():
 
 
 
-def run_cmd(cmd_list, timeout=60*60):
-    # Stream output into your garmindb.log AND return last lines in response if desired
-    env = os.environ.copy()
-    proc = subprocess.run(
-        cmd_list,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        timeout=timeout,
-        check=False,
-    )
-    return proc.returncode, proc.stdout
-
 @api.post("/api/update")
 def api_update():
     """
-    Incremental update by default (uses --latest).
-    Optional: /api/update?mode=full to do a full pass (no --latest).
+    Kick off a garmindb update in the background and return a job id.
+    Incremental by default; /api/update?mode=full does a full pass.
+    Poll /api/update/status?id=<job_id> for the result so the worker is
+    free to serve data endpoints while the CLI runs.
     """
     mode = (request.args.get("mode") or "latest").lower()
+    job_id = next(_JOB_IDS)
+    _JOBS[job_id] = _UPDATE_POOL.submit(_run_garmindb, mode)
+    return _json({"ok": True, "job_id": job_id, "mode": mode}, 202)
 
-    base = [
-        "garmindb_cli.py",
-        "--all",
-        "--download",
-        "--import",
-        "--analyze",
-    ]
-
-    # Incremental by default
-    if mode == "latest":
-        base.append("--latest")  # incremental update
-
-    # If you want to ensure folders each time, do it separately or keep your existing endpoint
-
-    rc, out = run_cmd(base)
-    ok = (rc == 0)
-    return jsonify({
-        "ok": ok,
-        "mode": mode,
-        "command": " ".join(shlex.quote(x) for x in base),
-        "logTail": "\n".join(out.splitlines()[-50:])  # last 50 lines for quick debugging
-    }), (200 if ok else 500)
+@api.get("/api/update/status")
+def update_status():
+    try:
+        job_id = int(request.args.get("id", ""))
+    except ValueError:
+        return _json_error("Pass ?id=<job_id> from /api/update", 400)
+    fut = _JOBS.get(job_id)
+    if fut is None:
+        return _json_error(f"No such job: {job_id}", 404)
+    if not fut.done():
+        return _json({"job_id": job_id, "done": False})
+    try:
+        return _json({"job_id": job_id, "done": True, "result": fut.result()})
+    except Exception as e:
+        return _json_error(str(e))
 
 @api.get("/api/update/log")
 def update_log():
@@ -193,8 +220,7 @@ def daily_summary():
     guard = _require_db_exists()
     if guard: return guard
     try:
-        data = fetch_daily_summary()
-        return jsonify(_clean_json(data))
+        return _cached_fetch(fetch_daily_summary)
     except Exception as e:
         return _json_error(str(e))
 
@@ -203,8 +229,7 @@ def stress_endpoint():
     guard = _require_db_exists()
     if guard: return guard
     try:
-        data = fetch_stress()
-        return jsonify(_clean_json(data))
+        return _cached_fetch(fetch_stress)
     except Exception as e:
         return _json_error(str(e))
 
@@ -213,8 +238,7 @@ def steps():
     guard = _require_db_exists()
     if guard: return guard
     try:
-        data = fetch_steps()
-        return jsonify(_clean_json(data))
+        return _cached_fetch(fetch_steps)
     except Exception as e:
         return _json_error(str(e))
 
@@ -223,8 +247,7 @@ def exercise():
     guard = _require_db_exists()
     if guard: return guard
     try:
-        data = fetch_exercise()
-        return jsonify(_clean_json(data))
+        return _cached_fetch(fetch_exercise)
     except Exception as e:
         return _json_error(str(e))
 
@@ -233,15 +256,14 @@ def sleep():
     guard = _require_db_exists()
     if guard: return guard
     try:
-        data = fetch_sleep()
-        return jsonify(_clean_json(data))
+        return _cached_fetch(fetch_sleep)
     except Exception as e:
         return _json_error(str(e))
 
 
 @api.get("/")
 def root():
-    return jsonify({"ok": True, "msg": "Backend running. Try /api/daily-summary"}), 200
+    return _json({"ok": True, "msg": "Backend running. Try /api/daily-summary"})
 
 @api.get("/health")
 def health():
@@ -250,7 +272,7 @@ def health():
 @api.get("/api/db-info")
 def db_info():
     p = DB_PATH
-    return jsonify({"db_path": str(p), "exists": p.exists(), "size_bytes": p.stat().st_size if p.exists() else 0})
+    return _json({"db_path": str(p), "exists": p.exists(), "size_bytes": p.stat().st_size if p.exists() else 0})
 
 @api.delete("/api/erase")
 def erase_data():
@@ -262,9 +284,26 @@ def erase_data():
         return _json_error("You must pass ?confirm=true to erase all data", 400)
 
     try:
-        for item in target.iterdir():
-            if item.is_dir(): shutil.rmtree(item)
-            else: item.unlink()
+        reset_connections()  # drop the cached read-only handle before unlinking the DB
+        _RESP_CACHE.clear()
+
+        def _rm(p):
+            try:
+                if p.is_dir():
+                    shutil.rmtree(p)
+                else:
+                    p.unlink()
+            except FileNotFoundError:
+                pass  # already gone
+
+        # IO-bound: tens of thousands of FIT files delete much faster with
+        # several unlink syscalls in flight, one worker per top-level subtree.
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            list(ex.map(_rm, target.iterdir()))
+        invalidate_tree_cache()
+        # Only after the delete finishes: resetting earlier lets a request
+        # arriving mid-erase re-cache exists=True for up to a second.
+        _DB_STAT_CACHE["t"] = 0.0
 
         garth_session = CFG_PATH.parent / "garth_session"
         if garth_session.exists():
@@ -273,6 +312,6 @@ def erase_data():
             except Exception as e:
                 return _json_error(str(e))
 
-        return jsonify({"status": "erased_all_contents", "path_cleared": str(target)})
+        return _json({"status": "erased_all_contents", "path_cleared": str(target)})
     except Exception as e:
         return _json_error(str(e))
@@ -0,0 +1,15 @@
+"""
+Production entry point. The Werkzeug dev server (app.run) is single-threaded;
+serve with Gunicorn instead:
+
+    gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+Keep it at one worker: update job state (_JOBS/_UPDATE_POOL in routes) lives
+in process memory, so with multiple workers status polls can land on a worker
+that never saw the job, and each worker would run its own concurrent garmindb
+pass. One multithreaded worker is plenty here — WAL mode plus the per-thread
+read-only SQLite connections let all eight threads read concurrently.
+"""
+from app import create_app
+
+app = create_app()
@@ -14,6 +14,16 @@ const toDay = (d) => (d ? (d.slice?.(0, 10) ?? String(d).slice(0, 10)) : "");
 const numOrNull = (v) => (typeof v === "number" && Number.isFinite(v) ? v : null);
 const sortAsc = (arr) => arr.slice().sort((a, b) => (toDay(a.date) > toDay(b.date) ? 1 : -1));
 
+/* Decode JSON-Tables payloads ({__dict_type: "table", cols, row_data}) into row objects. */
+const toRows = (d) => {
+  if (Array.isArray(d)) return d;
+  if (d?.__dict_type === "table") {
+    return (d.row_data || []).map((r) =>
+        Object.fromEntries((d.cols || []).map((c, i) => [c, r[i]])));
+  }
+  return [];
+};
+
 /* Endpoint-specific normalizers */
 const normSteps = (rows) =>
     sortAsc((rows || []).map((r) => {
@@ -113,7 +123,7 @@ function App() {
         setCfgStart(existingStart);
 
         const { data: st } = await axios.get(`${API}/api/steps`);
-        if (Array.isArray(st) && st.length > 0) {
+        if (toRows(st).length > 0) {
           await fetchAll();
           setPhase("ready");
         } // else: remain on setup by default
@@ -124,6 +134,17 @@ function App() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  // Kick off a backend update job and poll until it finishes
+  const runUpdate = async (mode) => {
+    const { data: job } = await axios.post(`${API}/api/update${mode ? `?mode=${mode}` : ""}`);
+    if (!job?.job_id) return job;
+    for (;;) {
+      await new Promise((r) => setTimeout(r, 2000));
+      const { data: st } = await axios.get(`${API}/api/update/status`, { params: { id: job.job_id } });
+      if (st?.done) return st.result;
+    }
+  };
+
   // Fetch & normalize
   const fetchAll = async () => {
     setLoading(true);
@@ -135,10 +156,10 @@ function App() {
         axios.get(`${API}/api/sleep`),
       ]);
 
-      setSteps(normSteps(Array.isArray(s2.data) ? s2.data : []));
-      setStress(normStress(Array.isArray(s3.data) ? s3.data : []));
-      setExercise(normExercise(Array.isArray(s4.data) ? s4.data : []));
-      setSleep(normSleep(Array.isArray(s5.data) ? s5.data : []));
+      setSteps(normSteps(toRows(s2.data)));
+      setStress(normStress(toRows(s3.data)));
+      setExercise(normExercise(toRows(s4.data)));
+      setSleep(normSleep(toRows(s5.data)));
     } finally {
       setLoading(false);
     }
@@ -161,7 +182,7 @@ function App() {
       };
       await axios.post(`${API}/api/config`, payload);
       await axios.post(`${API}/api/ensure-folders`);
-      await axios.post(`${API}/api/update`);
+      await runUpdate();
       await fetchAll();
       setPhase("ready");
     } catch (e) {
@@ -176,7 +197,7 @@ function App() {
   const updateData = async () => {
     setLoading(true);
     try {
-      await axios.post(`${API}/api/update`);
+      await runUpdate();
       await fetchAll();
     } finally {
       setLoading(false);